@@ -1,105 +1,491 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, render_template, request, jsonify
+from flask.json.provider import JSONProvider
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import repeat
 import json
+import orjson
 from pathlib import Path
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.vectorstores import FAISS
 from langchain.schema import Document
+from langchain_core.messages import HumanMessage, SystemMessage
 from langchain.chains import RetrievalQA
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.retrievers.multi_query import MultiQueryRetriever
+from sentence_transformers import CrossEncoder
 from dotenv import load_dotenv
+from query_cache import QueryCache, normalize_query
+from keyword_index import BM25Index
+from prompts import (
+    CASE_LAW_USER_TEMPLATE,
+    GENERAL_USER_TEMPLATE,
+    case_law_system_prompt,
+    general_system_prompt,
+)
+from index_format import EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, add_display_fields
+from server_config import WORKER_THREADS
+import faiss
+import httpx
+import numpy as np
 import os
+import pickle
+import threading
+import tiktoken
+import torch
+
+# Optional GPU search (pip install cuvs-cu12 cupy-cuda12x); without it, or
+# without a CUDA device, retrieval stays on CPU FAISS.
+try:
+    import cupy
+    from cuvs.neighbors import cagra
+except ImportError:
+    cupy = cagra = None
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+class ORJSONProvider(JSONProvider):
+    # Used by request.get_json() and jsonify(); orjson writes UTF-8 bytes
+    # directly, so responses skip the str -> bytes round-trip.
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=ORJSON_OPTIONS),
+            mimetype="application/json",
+        )
+
+
+class ChatbotFlask(Flask):
+    json_provider_class = ORJSONProvider
 
-app = Flask(__name__)
 
 # 🧹 Fix newline/whitespace in API key
 key = os.getenv("OPENAI_API_KEY")
 if key:
     key = key.strip()
     os.environ["OPENAI_API_KEY"] = key
-# ====================================
-# Load FAISS index (FAST, NO chunking)
-# ====================================
-embeddings = OpenAIEmbeddings(model="text-embedding-ada-002")
 
-vectorstore = FAISS.load_local(
-    "faiss_index",
-    embeddings,
-    allow_dangerous_deserialization=True
-)
+# The index is built offline by build_index.py; never re-embed at boot.
+FAISS_INDEX_DIR = "faiss_index"
 
-retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
+# Single-shot retrieval: one query embedding, a wide FAISS search, then a
+# local cross-encoder picks the best few. No LLM call before the answer.
+RETRIEVAL_K = 20
+KEYWORD_K = 5
+RERANK_TOP_N = 5
 
-# LLM for multi-query
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+# Intra-op threads per reranker call. Up to WORKER_THREADS gthreads in each
+# worker call predict() at once, so torch's default (every core per call)
+# would oversubscribe the CPU many times over.
+RERANK_THREADS = 1
 
-# Multi-query wrapper (optional)
-multi_retriever = MultiQueryRetriever.from_llm(
-    retriever=retriever,
-    llm=llm
-)
+# The model opens its answer with this line when it declines a question;
+# it is then returned on its own, without sources.
+REFUSAL_LINE = "I'm only able to assist with South African legal questions based on SAFLII case law."
 
-print("✅ Loaded FAISS index and retriever successfully!")
+# Shared OpenAI connection pool size, per worker process.
+HTTP_MAX_CONNECTIONS = 64
+
+# /ask_batch: at most MAX_BATCH_SIZE queries per call. Their completions run
+# on one pool shared by the whole worker, sized so that pool plus the
+# worker's gthreads never ask for more than HTTP_MAX_CONNECTIONS.
+MAX_BATCH_SIZE = 64
+LLM_BATCH_WORKERS = HTTP_MAX_CONNECTIONS - WORKER_THREADS
+
+# Retrieved context is capped at this many prompt tokens; prompt length
+# drives both prefill latency and cost.
+MAX_CONTEXT_TOKENS = 3000
+
+# ====================================
+# Heavy objects, each loaded once per process on first use.
+# create_app() warms most of them, so with gunicorn's preload_app they are
+# loaded once in the master and shared copy-on-write by every worker; what
+# can't cross a fork is set up per worker by init_worker().
+# ====================================
+@lru_cache(maxsize=1)
+def get_faiss_index():
+    # IO_FLAG_MMAP_IFC maps the stored vectors (flat / scalar-quantizer
+    # codes) read-only from the file, so workers share the same page-cache
+    # pages instead of each keeping a copy. Plain IO_FLAG_MMAP only maps
+    # IVF inverted lists and would load these indexes fully into RAM.
+    return faiss.read_index(
+        os.path.join(FAISS_INDEX_DIR, "index.faiss"),
+        faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+    )
+
+
+# One CAGRA graph per process, built off the request path: searches use CPU
+# FAISS until it is ready, or for good if the build fails. Each gunicorn
+# worker builds its own copy on the GPU, so run one worker per GPU.
+_gpu_index = None
+_gpu_index_started = False
+_gpu_index_lock = threading.Lock()
+
+
+def start_gpu_index_build():
+    # A CUDA context does not survive fork, so this runs in each worker
+    # (init_worker, from gunicorn's post_fork hook), never in the master.
+    # search_index also calls it, which covers `flask run`.
+    global _gpu_index_started
+    if cagra is None or _gpu_index_started:
+        return
+    with _gpu_index_lock:
+        if _gpu_index_started:
+            return
+        _gpu_index_started = True
+    threading.Thread(target=_build_gpu_index, name="cagra-build", daemon=True).start()
+
+
+def _build_gpu_index():
+    global _gpu_index
+    try:
+        if cupy.cuda.runtime.getDeviceCount() == 0:
+            return
+        index = get_faiss_index()
+        xb = index.reconstruct_n(0, index.ntotal)
+        _gpu_index = cagra.build(cagra.IndexParams(), cupy.asarray(xb))
+    except Exception as exc:
+        # e.g. GPU OOM, or fewer vectors than the CAGRA graph degree.
+        print(f"⚠️ cuVS CAGRA build failed, searching on CPU FAISS: {exc}")
+        return
+
+    print("⚡ Searching with cuVS CAGRA on the GPU")
+
+
+def search_index(query_vectors, k):
+    queries = np.asarray(query_vectors, dtype="float32")
+    start_gpu_index_build()
+    gpu_index = _gpu_index
+    if gpu_index is None:
+        _, neighbours = get_faiss_index().search(queries, k)
+        return neighbours
+
+    _, neighbours = cagra.search(cagra.SearchParams(), gpu_index, cupy.asarray(queries), k)
+    return cupy.asarray(neighbours).get()
+
+
+@lru_cache(maxsize=1)
+def get_http_client():
+    # One keep-alive HTTP/2 connection pool shared by every OpenAI call, so
+    # requests don't pay a fresh TLS handshake each time. No connection is
+    # opened until the first request, so forked workers never share sockets.
+    return httpx.Client(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=HTTP_MAX_CONNECTIONS),
+        timeout=60,
+    )
+
+
+_llm_batch_pool = None
+_llm_batch_pool_lock = threading.Lock()
+
+
+def get_llm_batch_pool():
+    # One pool per worker process, shared by every /ask_batch request so
+    # concurrent batches can't multiply the number of in-flight completions.
+    # Created by init_worker() rather than create_app(): threads don't
+    # survive fork. The lock keeps concurrent first calls (lru_cache can
+    # run its function more than once) from creating a second pool.
+    global _llm_batch_pool
+    if _llm_batch_pool is None:
+        with _llm_batch_pool_lock:
+            if _llm_batch_pool is None:
+                _llm_batch_pool = ThreadPoolExecutor(
+                    max_workers=LLM_BATCH_WORKERS, thread_name_prefix="llm-batch"
+                )
+    return _llm_batch_pool
+
+
+@lru_cache(maxsize=1)
+def get_embeddings():
+    # Queries must be embedded with the model the index was built with. Until
+    # faiss_index/ is rebuilt, older deployments still hold a 1536-d ada-002 index.
+    if get_faiss_index().d == EMBEDDING_DIMENSIONS:
+        return OpenAIEmbeddings(
+            model=EMBEDDING_MODEL,
+            dimensions=EMBEDDING_DIMENSIONS,
+            http_client=get_http_client(),
+        )
+    print("⚠️ faiss_index/ predates text-embedding-3-small; run build_index.py to migrate.")
+    return OpenAIEmbeddings(model="text-embedding-ada-002", http_client=get_http_client())
+
+
+@lru_cache(maxsize=1)
+def get_vectorstore():
+    # FAISS.load_local would read index.faiss fully into RAM a second time,
+    # so only the docstore comes from disk here; the index is the mapped one.
+    # index.pkl is written by our own build_index.py, so unpickling is safe.
+    with open(os.path.join(FAISS_INDEX_DIR, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    vectorstore = FAISS(
+        embedding_function=get_embeddings(),
+        index=get_faiss_index(),
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+    # Indexes built before display fields were stored in metadata get them
+    # once here.
+    for doc in vectorstore.docstore._dict.values():
+        if "source_header" not in doc.metadata:
+            add_display_fields(doc)
+
+    return vectorstore
+
+
+@lru_cache(maxsize=1)
+def get_keyword_index():
+    # BM25 catches exact terms (section numbers, party names) that embeddings
+    # can miss; its hits join the FAISS candidates before reranking.
+    return BM25Index(list(get_vectorstore().docstore._dict.values()))
+
+
+@lru_cache(maxsize=1)
+def get_reranker():
+    # Loaded in each worker by init_worker(), not in the preloaded master:
+    # torch/OpenMP state inherited across fork can hang the child.
+    torch.set_num_threads(RERANK_THREADS)
+    return CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+
+@lru_cache(maxsize=1)
+def get_llm():
+    return ChatOpenAI(model="gpt-4o-mini", temperature=0, http_client=get_http_client())
+
+
+@lru_cache(maxsize=1)
+def get_prompt_encoding():
+    return tiktoken.encoding_for_model("gpt-4o-mini")
+
+
+# Repeated (or near-identical) questions skip retrieval and the LLM entirely.
+query_cache = QueryCache(max_size=2000, ttl_seconds=600, similarity_threshold=0.95)
+
+chat = Blueprint("chat", __name__)
 
 # ====================================
 # Flask route for chat
 # ====================================
-@app.route("/")
+@chat.route("/")
 def index():
     return render_template("index.html")
 
-@app.route("/ask", methods=["POST"])
-def ask():
-    data = request.get_json() or {}
-    user_query = data.get("query", "").strip()
+def parse_options(data):
     mode = (data.get("mode", "case_law") or "case_law").strip().lower()
     prompt_type = (data.get("prompt_type", "fewshot") or "fewshot").strip().lower()
     if prompt_type not in {"fewshot", "zeroshot", "concise", "citation"}:
         prompt_type = "fewshot"
+    return mode, prompt_type
+
+
+@chat.route("/ask", methods=["POST"])
+def ask():
+    data = request.get_json() or {}
+    user_query = data.get("query", "").strip()
+    mode, prompt_type = parse_options(data)
 
     if not user_query:
         return jsonify({"answer": "Please enter a question.", "sources": []})
 
-    if mode == "general":
-        if prompt_type == "zeroshot":
-            prompt = f"""
-You are a South African legal research assistant.
+    cache_namespace = (mode, prompt_type)
+    cache_key = (mode, prompt_type, normalize_query(user_query))
+    payload = query_cache.get(cache_key)
+    if payload is None:
+        # Paraphrases of a recent question are served from the cache too.
+        query_vector = get_embeddings().embed_query(user_query)
+        payload = query_cache.get_similar(cache_namespace, query_vector)
+    if payload is not None:
+        return jsonify(with_question(payload, user_query))
+
+    docs = retrieve(user_query, query_vector) if mode != "general" else []
+    payload = answer_query(user_query, mode, prompt_type, docs)
+    query_cache.put(
+        cache_key,
+        without_question(payload, user_query),
+        namespace=cache_namespace,
+        vector=query_vector,
+    )
+    return jsonify(payload)
+
+
+@chat.route("/ask_batch", methods=["POST"])
+def ask_batch():
+    data = request.get_json() or {}
+    queries = data.get("queries")
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return jsonify({"error": "'queries' must be a list of strings."}), 400
+    if len(queries) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} queries per batch."}), 400
+    mode, prompt_type = parse_options(data)
+    cache_namespace = (mode, prompt_type)
+
+    results = [None] * len(queries)
+    # Normalized query -> (first spelling seen, result indexes). Repeats
+    # within a batch are embedded, retrieved and answered once.
+    pending = {}
+    for i, user_query in enumerate(queries):
+        user_query = user_query.strip()
+        if not user_query:
+            results[i] = {"answer": "Please enter a question.", "sources": []}
+            continue
+        normalized = normalize_query(user_query)
+        if normalized in pending:
+            pending[normalized][1].append(i)
+            continue
+        payload = query_cache.get((mode, prompt_type, normalized))
+        if payload is not None:
+            results[i] = with_question(payload, user_query)
+        else:
+            pending[normalized] = (user_query, [i])
+
+    if pending:
+        # One embeddings API call for every uncached query in the batch.
+        vectors = get_embeddings().embed_documents([q for q, _ in pending.values()])
+        misses = []
+        for (normalized, (user_query, indexes)), query_vector in zip(pending.items(), vectors):
+            payload = query_cache.get_similar(cache_namespace, query_vector)
+            if payload is not None:
+                payload = with_question(payload, user_query)
+                for i in indexes:
+                    results[i] = payload
+            else:
+                misses.append((normalized, user_query, indexes, query_vector))
+
+        if misses:
+            miss_queries = [q for _, q, _, _ in misses]
+            if mode != "general":
+                docs_per_query = retrieve_batch(miss_queries, [v for _, _, _, v in misses])
+            else:
+                docs_per_query = [[] for _ in misses]
+
+            # The LLM calls are independent network waits; run them side by side.
+            payloads = get_llm_batch_pool().map(
+                answer_query,
+                miss_queries,
+                repeat(mode),
+                repeat(prompt_type),
+                docs_per_query,
+            )
+            for (normalized, user_query, indexes, query_vector), payload in zip(misses, payloads):
+                query_cache.put(
+                    (mode, prompt_type, normalized),
+                    without_question(payload, user_query),
+                    namespace=cache_namespace,
+                    vector=query_vector,
+                )
+                for i in indexes:
+                    results[i] = payload
+
+    return jsonify({"results": results})
+
+
+# The debug prompt ends with the asker's question (both user templates end
+# in {user_query}). It is cached without it, since a similarity hit serves
+# the entry to someone else, and every hit appends the current question.
+def without_question(payload, user_query):
+    return {**payload, "prompt": payload["prompt"][:-len(user_query)]}
+
+
+def with_question(payload, user_query):
+    return {**payload, "prompt": payload["prompt"] + user_query}
+
+
+@chat.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(query_cache.stats())
+
+
+def retrieve(user_query, query_vector):
+    return retrieve_batch([user_query], [query_vector])[0]
+
+
+def retrieve_batch(user_queries, query_vectors):
+    vectorstore = get_vectorstore()
+    keyword_index = get_keyword_index()
+
+    # One search call for the whole batch (FAISS, or CAGRA on a GPU): a
+    # single matrix search rather than one search per query.
+    neighbours = search_index(query_vectors, RETRIEVAL_K)
+
+    candidate_lists = []
+    for user_query, row in zip(user_queries, neighbours):
+        candidates = [
+            vectorstore.docstore._dict[vectorstore.index_to_docstore_id[i]]
+            for i in row
+            if 0 <= i < len(vectorstore.index_to_docstore_id)
+        ]
+        # BM25 returns the same docstore objects, so dedup by identity rather
+        # than Document.__eq__, which compares every field.
+        seen = {id(d) for d in candidates}
+        candidates += [
+            d for d in keyword_index.get_top_n(user_query, n=KEYWORD_K)
+            if id(d) not in seen
+        ]
+        candidate_lists.append(candidates)
+
+    # Likewise one cross-encoder pass over every (query, chunk) pair.
+    pairs = [
+        (user_query, d.page_content)
+        for user_query, candidates in zip(user_queries, candidate_lists)
+        for d in candidates
+    ]
+    scores = get_reranker().predict(pairs) if pairs else []
+
+    results = []
+    start = 0
+    for candidates in candidate_lists:
+        end = start + len(candidates)
+        ranked = sorted(
+            zip(scores[start:end], candidates), key=lambda pair: pair[0], reverse=True
+        )
+        results.append([d for _, d in ranked[:RERANK_TOP_N]])
+        start = end
+    return results
+
+
+def build_context(docs):
+    # docs arrive best-first from the reranker, so stopping at the budget
+    # drops the lowest-ranked chunks.
+    encoding = get_prompt_encoding()
+    blocks = []
+    used_tokens = 0
+    for d in docs:
+        block = f"{d.metadata['source_header']}\n{d.metadata['preview_800']}"
+        used_tokens += len(encoding.encode(block))
+        if used_tokens > MAX_CONTEXT_TOKENS:
+            break
+        blocks.append(block)
 
-Answer the user's question in a single, coherent narrative in professional South African legal style.
-Do NOT use headings, bullet lists, or numbered lists.
-You may include normal references to South African case law where appropriate, using real case names and citations if they are relevant to the legal issue. Do not invent cases or citations.
+    return "\n\n".join(blocks), docs[:len(blocks)]
 
-Question:
-{user_query}
-"""
-        else:
-            prompt = f"""
-You are a South African legal research assistant.
-
-First, decide whether the user's question is asking for South African legal principles, case law, or both.
-Answer in a single, coherent narrative in professional South African legal style.
-Do NOT use headings, bullet lists, or numbered lists.
-You may include normal references to South African case law where appropriate, using real case names and citations if they are relevant to the legal issue. Do not invent cases or citations.
-
-Question:
-{user_query}
-"""
-        response = llm.invoke(prompt)
+
+def answer_query(user_query, mode, prompt_type, docs):
+    if mode == "general":
+        system_prompt = general_system_prompt(prompt_type)
+        user_prompt = GENERAL_USER_TEMPLATE.format_map({"user_query": user_query})
+        prompt = f"{system_prompt}\n{user_prompt}"
+
+        response = get_llm().invoke([SystemMessage(system_prompt), HumanMessage(user_prompt)])
         answer = response.content if hasattr(response, "content") else str(response)
 
-        refusal_line = "I'm only able to assist with South African legal questions based on SAFLII case law."
-        if refusal_line in answer:
-            return jsonify({
-                "answer": refusal_line,
+        if answer.lstrip().startswith(REFUSAL_LINE):
+            return {
+                "answer": REFUSAL_LINE,
                 "sources": [],
                 "retrieval_summary": {
                     "mode": "general",
                     "note": "General mode uses LLM knowledge without local retrieval."
                 },
                 "prompt": prompt,
-            })
+            }
 
-        return jsonify({
+        return {
             "answer": answer,
             "sources": [],
             "retrieval_summary": {
@@ -107,197 +493,22 @@ Question:
                 "note": "General mode uses LLM knowledge without local retrieval."
             },
             "prompt": prompt,
-        })
+        }
 
-    # --- 1) Multi-query expansion over local FAISS index ---
-    docs = multi_retriever.get_relevant_documents(user_query)
+    # --- 1) Reranked chunks (see retrieve_batch), trimmed to the token budget ---
+    context, docs = build_context(docs)
 
-    # --- 2) Simple fallback: plain retriever with bigger k (no chunked_docs any more) ---
-    if not docs:
-        # Try again with standard retriever & a larger top-k
-        docs = retriever.get_relevant_documents(user_query)
+    # --- 2) Static instructions as the system message, context + question as the user message ---
+    system_prompt = case_law_system_prompt(prompt_type)
+    user_prompt = CASE_LAW_USER_TEMPLATE.format_map({"context": context, "user_query": user_query})
+    prompt = f"{system_prompt}\n{user_prompt}"
 
-    context_parts = []
-    for d in docs:
-        m = d.metadata or {}
-        case_name = m.get("case_name") or "Unknown case"
-        citation = m.get("neutral_citation") or ""
-        court = m.get("court") or ""
-        jd = m.get("judgment_date") or ""
-        saflii_url = m.get("saflii_case_url") or m.get("saflii_url") or ""
-
-        header = f"Source: {case_name} ({citation})"
-        if court or jd:
-            header += f" – {court} {jd}".strip()
-        if saflii_url:
-            header += f"\nSAFLII: {saflii_url}"
-
-        snippet = d.page_content[:800] + "..."
-        context_parts.append(f"{header}\n{snippet}")
-
-    context = "\n\n".join(context_parts)
-
-    if prompt_type == "zeroshot":
-        prompt = f"""
-You are a South African legal research assistant.
-
-Answer the question below in a single, coherent narrative in professional South African legal style.
-Do NOT use headings, bullet lists, or numbered lists.
-Prefer to base your answer on the SAFLII context below.
-If the context does not clearly cover the issue, you may still answer using general South African legal principles, and you should say that no specific SAFLII cases could be identified from the provided context.
-Only cite cases from metadata when you rely on a rule grounded in a case.
-
-Question:
-{user_query}
-
-Context:
-{context}
-"""
-    elif prompt_type == "citation":
-        prompt = f"""
-    You are a South African legal research assistant.
-
-    First, decide whether the user's question is:
-    (A) a South African legal question (doctrinal, case-law or practical), or
-
-    If it is (A), you may answer even if the context is limited, but:
-    - You may ONLY cite cases that appear in the Context metadata below.
-    - Ignore case names inside the raw judgment text. Only cite cases from metadata.
-    - Prefer to base your answer on the SAFLII context below.
-    - If the context does not clearly cover the issue, you may still answer using general
-    South African legal principles, and you should say that no specific SAFLII cases
-    could be identified from the provided context.
-
-    The Context section below contains the available cases and their neutral citations.
-    You MUST obey the following when writing your answer:
-
-    1. Always answer in South African legal style, citing case law where relevant.
-    2. Write a single, coherent narrative answer in professional South African legal style.
-    Do NOT use headings, bullet lists or numbered lists.
-    3. Whenever you state a specific legal rule, test, or conclusion that is grounded
-    in a case, explicitly weave the case into the sentence, e.g.:
-    "According to Atamelang Bus Transport (Pty) Ltd v MEC for Community Safety
-    [2025] ZANWHC 191, the court held that ..."
-    or
-    "Similarly, in NUM obo Employees v CCMA [2011] ZALAC 7 the Labour Appeal Court confirmed that ...".
-    4. Never invent new cases, new citations, or paraphrase existing cases into new forms. You may only use cases exactly as provided.
-    5. When you refer to a case from the Context, ALWAYS include its neutral citation
-    exactly as shown there (e.g. "Case v Case [2011] ZASCA 3").
-    6. Do NOT add a separate "Sources" or "References" section; just integrate cases
-    naturally into the narrative.
-    7. Ignore case names inside the raw judgment text for sourcing. Only cite cases that appear in the provided metadata or cases explicitly relied on by those metadata cases.
-    8. If a metadata case quotes or relies on another case, you may mention that embedded case as a secondary authority, but you must clearly anchor it to the metadata case that cites it.
-    9. When you mention a case, include its neutral citation exactly as shown in the Context.
-
-    IMPORTANT: The Context contains two levels of authority:
-
-    (1) METADATA CASES: These are the judgments for which you have
-        metadata entries (case_name, neutral_citation, court, date).
-        These are your PRIMARY authorities.
-
-    (2) EMBEDDED CASES: These are cases mentioned inside the raw text of
-    the metadata cases (for example, "as held in Minister of Safety and
-    Security v Van Duivenboden", quoted inside another judgment).
-
-    RULES:
-
-    - You must ALWAYS treat the metadata case as the primary authority.
-    - When you rely on a legal rule that appears in a metadata case, you MUST cite that metadata case.
-    - If the raw text also mentions another case (an embedded case), you MAY mention that case too, but you MUST show that you know
-    it only through the metadata case, e.g.:
-
-    "In D_D v SAFAMCO Enterprises (Pty) Ltd [2025] ZAWCHC 535 the Court,
-    relying on Minister of Safety and Security v Van Duivenboden, held
-    that negligence alone is not inherently unlawful."
-
-    You are NOT allowed to present embedded cases as if you have read their
-    judgments directly. They must always be anchored to the metadata case
-    that quotes them.
-    ---
-    Context:
-    {context}
-
-    Question:
-    {user_query}
-    """
-    else:
-        prompt = f"""
-    You are a South African legal research assistant.
-
-    First, decide whether the user's question is:
-    (A) a South African legal question (doctrinal, case-law or practical), or
-
-    If it is (A), you may answer even if the context is limited, but:
-    - You may ONLY cite cases that appear in the Context metadata below.
-    - Ignore case names inside the raw judgment text. Only cite cases from metadata.
-    - Prefer to base your answer on the SAFLII context below.
-    - If the context does not clearly cover the issue, you may still answer using general
-    South African legal principles, and you should say that no specific SAFLII cases
-    could be identified from the provided context.
-
-    The Context section below contains the available cases and their neutral citations.
-    You MUST obey the following when writing your answer:
-
-    1. Always answer in South African legal style, citing case law where relevant.
-    2. Write a single, coherent narrative answer in professional South African legal style.
-    Do NOT use headings, bullet lists or numbered lists.
-    3. Whenever you state a specific legal rule, test, or conclusion that is grounded
-    in a case, explicitly weave the case into the sentence, e.g.:
-    "According to Atamelang Bus Transport (Pty) Ltd v MEC for Community Safety
-    [2025] ZANWHC 191, the court held that ..."
-    or
-    "Similarly, in NUM obo Employees v CCMA [2011] ZALAC 7 the Labour Appeal Court confirmed that ...".
-    4. Never invent new cases, new citations, or paraphrase existing cases into new forms. You may only use cases exactly as provided.
-    5. When you refer to a case from the Context, ALWAYS include its neutral citation
-    exactly as shown there (e.g. "Case v Case [2011] ZASCA 3").
-    6. Do NOT add a separate "Sources" or "References" section; just integrate cases
-    naturally into the narrative.
-    7. Ignore case names inside the raw judgment text for sourcing. Only cite cases that appear in the provided metadata or cases explicitly relied on by those metadata cases.
-    8. If a metadata case quotes or relies on another case, you may mention that embedded case as a secondary authority, but you must clearly anchor it to the metadata case that cites it.
-    9. When you mention a case, include its neutral citation exactly as shown in the Context.
-
-    IMPORTANT: The Context contains two levels of authority:
-
-    (1) METADATA CASES: These are the judgments for which you have
-        metadata entries (case_name, neutral_citation, court, date).
-        These are your PRIMARY authorities.
-
-    (2) EMBEDDED CASES: These are cases mentioned inside the raw text of
-        the metadata cases (for example, "as held in Minister of Safety and
-        Security v Van Duivenboden", quoted inside another judgment).
-
-    RULES:
-
-    - You must ALWAYS treat the metadata case as the primary authority.
-    - When you rely on a legal rule that appears in the raw text of a
-    metadata case, you MUST cite that metadata case.
-    - If the raw text also mentions another case (an embedded case),
-    you MAY mention that case too, but you MUST show that you know
-    it only through the metadata case, e.g.:
-
-    "In D_D v SAFAMCO Enterprises (Pty) Ltd [2025] ZAWCHC 535 the Court,
-    relying on Minister of Safety and Security v Van Duivenboden, held
-    that negligence alone is not inherently unlawful."
-
-    You are NOT allowed to present embedded cases as if you have read their
-    judgments directly. They must always be anchored to the metadata case
-    that quotes them.
-    ---
-    Context:
-    {context}
-
-    Question:
-    {user_query}
-    """
-
-
-    response = llm.invoke(prompt)
+    response = get_llm().invoke([SystemMessage(system_prompt), HumanMessage(user_prompt)])
     answer = response.content if hasattr(response, "content") else str(response)
 
-    refusal_line = "I'm only able to assist with South African legal questions based on SAFLII case law."
-    if refusal_line in answer:
-        return jsonify({
-            "answer": refusal_line,
+    if answer.lstrip().startswith(REFUSAL_LINE):
+        return {
+            "answer": REFUSAL_LINE,
             "sources": [],
             "retrieval_summary": {
                 "mode": "case_law",
@@ -305,12 +516,12 @@ Context:
                 "top_documents": []
             },
             "prompt": prompt,
-        })
+        }
 
-    # If we truly have no docs even after fallback → answer but say no sources
+    # If retrieval found nothing → answer but say no sources
     if not docs:
         answer += "\n\n_No specific SAFLII case excerpts could be retrieved for this query._"
-        return jsonify({
+        return {
             "answer": answer,
             "sources": [],
             "retrieval_summary": {
@@ -319,29 +530,21 @@ Context:
                 "top_documents": []
             },
             "prompt": prompt,
-        })
+        }
 
-    # --- 4) Build sources payload for the side drawer (dedup per case) ---
+    # --- 3) Build sources payload for the side drawer (dedup per case) ---
     sources = []
     seen_keys = set()
 
     for d in docs:
-        m = d.metadata or {}
-        key = (m.get("case_name"), m.get("neutral_citation"))
-        if key in seen_keys:
-            continue
-        seen_keys.add(key)
-
-        sources.append({
-            "case_name": m.get("case_name"),
-            "citation": m.get("neutral_citation"),
-            "court": m.get("court"),
-            "judgment_date": m.get("judgment_date"),
-            "saflii_url": m.get("saflii_case_url") or m.get("saflii_url"),
-            "pdf_url": m.get("pdf_url"),
-            # short preview of the chunk
-            "summary": d.page_content[:400] + "..."
-        })
+        # Entries are prebuilt at index time, one per case containing the
+        # chunk (see index_format.add_display_fields); here we only dedup.
+        for source in d.metadata["sources"]:
+            key = (source["case_name"], source["citation"])
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            sources.append(source)
 
     retrieval_summary = {
         "mode": "case_law",
@@ -357,19 +560,20 @@ Context:
         ],
     }
 
-    return jsonify({
+    return {
         "answer": answer,
         "sources": sources,
         "retrieval_summary": retrieval_summary,
         "prompt": prompt,
-    })
+    }
 
 
-@app.route("/vectorstore", methods=["GET"])
+@chat.route("/vectorstore", methods=["GET"])
 def vectorstore_preview():
     preview = []
     max_items = 20
 
+    vectorstore = get_vectorstore()
     for faiss_id, doc_id in list(vectorstore.index_to_docstore_id.items())[:max_items]:
         doc = vectorstore.docstore._dict.get(doc_id)
         if doc is None:
@@ -403,5 +607,24 @@ def vectorstore_preview():
     })
 
 
-if __name__ == "__main__":
-    app.run(debug=True)
+def init_worker():
+    # Per-process state that must not be created before gunicorn forks;
+    # gunicorn_conf.post_fork calls this in each worker.
+    start_gpu_index_build()
+    get_llm_batch_pool()
+    get_reranker()
+
+
+def create_app():
+    app = ChatbotFlask(__name__)
+    app.register_blueprint(chat)
+
+    # Load everything up front rather than on the first request. The
+    # reranker, GPU graph and batch pool are per worker (see init_worker).
+    get_vectorstore()
+    get_keyword_index()
+    get_llm()
+    get_prompt_encoding()
+    print("✅ Loaded FAISS index and retriever successfully!")
+
+    return app
@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from langchain.schema import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_openai import OpenAIEmbeddings
+
+from index_format import EMBEDDING_DIMENSIONS, EMBEDDING_MODEL, add_display_fields, source_entry
+
+# ====================================
+# One-off offline build of the FAISS index.
+# Run `python build_index.py` whenever the corpus changes; app.py only
+# ever loads the saved index from disk.
+# ====================================
+load_dotenv()
+
+# 🧹 Fix newline/whitespace in API key
+key = os.getenv("OPENAI_API_KEY")
+if key:
+    key = key.strip()
+    os.environ["OPENAI_API_KEY"] = key
+
+METADATA_PATH = Path("metadata/case_metadata_core_with_paths.json")
+INDEX_DIR = "faiss_index"
+CORPUS_HASH_PATH = Path(INDEX_DIR) / "corpus_hash"
+
+# Bump whenever the shape of the saved index changes in a way the settings
+# below don't capture (index type, dedup, metadata fields app.py reads), so
+# the corpus-hash check rebuilds instead of keeping a stale faiss_index/.
+BUILD_VERSION = 2
+
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 200
+
+# HNSW graph over float16 vectors: log-N search, half the RAM of float32
+# and no training pass, which IVF needs and small corpora starve. app.py
+# maps the float16 codes from index.faiss with IO_FLAG_MMAP_IFC; the graph
+# links are still loaded into each process.
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# Embedding requests: up to EMBED_BATCH_SIZE inputs per API call, with
+# EMBED_WORKERS calls in flight at once.
+EMBED_BATCH_SIZE = 1000
+EMBED_WORKERS = 8
+
+
+def load_text_path(raw_path):
+    # Metadata paths were written on Windows (clean_cases\substantive\...)
+    return Path(*raw_path.replace("\\", "/").split("/"))
+
+
+def mapped_file(f):
+    # mmap refuses zero-length files.
+    if os.fstat(f.fileno()).st_size == 0:
+        return memoryview(b"")
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def read_text(text_path):
+    # Decode straight from the mapped pages instead of reading into an
+    # intermediate bytes object first.
+    with open(text_path, "rb", buffering=1 << 20) as f, mapped_file(f) as data:
+        return str(data, "utf-8")
+
+
+def load_case_files():
+    with METADATA_PATH.open(encoding="utf-8") as f:
+        cases = json.load(f)
+
+    case_files = []
+    for case in cases:
+        raw_path = case.get("cleaned_text_path")
+        if not raw_path:
+            continue
+        text_path = load_text_path(raw_path)
+        if not text_path.exists():
+            print(f"⚠️ Missing text file, skipping: {text_path}")
+            continue
+        case_files.append((case, text_path))
+
+    return case_files
+
+
+def corpus_hash(case_files):
+    h = hashlib.blake2b(digest_size=16)
+    # Build settings are part of the hash: changing them must force a rebuild.
+    h.update(repr((
+        BUILD_VERSION,
+        EMBEDDING_MODEL,
+        EMBEDDING_DIMENSIONS,
+        CHUNK_SIZE,
+        CHUNK_OVERLAP,
+        HNSW_M,
+        HNSW_EF_CONSTRUCTION,
+        HNSW_EF_SEARCH,
+    )).encode())
+    h.update(METADATA_PATH.read_bytes())
+    for _, text_path in case_files:
+        with open(text_path, "rb", buffering=1 << 20) as f, mapped_file(f) as data:
+            h.update(data)
+    return h.hexdigest()
+
+
+@lru_cache(maxsize=1)
+def get_splitter():
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def split_one(text_path):
+    # Runs in a worker process: the file is read there, so full judgments
+    # are never pickled across processes, only their chunks coming back.
+    return get_splitter().split_text(read_text(text_path))
+
+
+def split_documents(case_files):
+    # The splitter is regex-heavy pure Python, so use processes, not threads.
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as pool:
+        chunk_lists = pool.map(split_one, [text_path for _, text_path in case_files], chunksize=4)
+        return [
+            add_display_fields(Document(page_content=chunk, metadata=dict(case)))
+            for (case, _), chunks in zip(case_files, chunk_lists)
+            for chunk in chunks
+        ]
+
+
+def deduplicate_chunks(chunked_docs):
+    # Boilerplate (headers, standard recitals) repeats across judgments;
+    # embed each distinct chunk once and keep the first occurrence.
+    primaries = {}
+    unique = []
+    for doc in chunked_docs:
+        digest = hashlib.blake2b(doc.page_content.encode(), digest_size=16).hexdigest()
+        primary = primaries.get(digest)
+        if primary is None:
+            primaries[digest] = doc
+            unique.append(doc)
+            continue
+
+        # Credit the dropped copy's case on the kept chunk, so app.py still
+        # cites every judgment containing the text.
+        entry = source_entry(doc.metadata, primary.metadata["preview_400"])
+        sources = primary.metadata["sources"]
+        if (entry["case_name"], entry["citation"]) not in {
+            (s["case_name"], s["citation"]) for s in sources
+        }:
+            sources.append(entry)
+
+    return unique
+
+
+def embed_texts(texts, embeddings):
+    batches = [
+        texts[i:i + EMBED_BATCH_SIZE]
+        for i in range(0, len(texts), EMBED_BATCH_SIZE)
+    ]
+    with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+        # map() keeps batch order, so vectors stay aligned with texts.
+        vectors = [v for batch in pool.map(embeddings.embed_documents, batches) for v in batch]
+    return np.asarray(vectors, dtype="float32")
+
+
+def build_hnsw_index(xb):
+    dim = xb.shape[1]
+    # Vectors go in as float32; QT_fp16 stores them as float16.
+    index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, HNSW_M)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.train(xb)
+    index.add(xb)
+    # Saved with the index, so app.py searches with it after the mapped load.
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def build_vectorstore(chunked_docs, embeddings):
+    texts = [d.page_content for d in chunked_docs]
+    xb = embed_texts(texts, embeddings)
+
+    index = build_hnsw_index(xb)
+
+    ids = [str(uuid.uuid4()) for _ in chunked_docs]
+    docstore = InMemoryDocstore(dict(zip(ids, chunked_docs)))
+    index_to_docstore_id = dict(enumerate(ids))
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the FAISS index in faiss_index/.")
+    parser.add_argument("--force", action="store_true", help="rebuild even if the corpus is unchanged")
+    args = parser.parse_args()
+
+    case_files = load_case_files()
+    print(f"📄 Found {len(case_files)} case files")
+
+    digest = corpus_hash(case_files)
+    if (
+        not args.force
+        and CORPUS_HASH_PATH.exists()
+        and CORPUS_HASH_PATH.read_text().strip() == digest
+    ):
+        print(f"✅ Corpus unchanged, keeping existing {INDEX_DIR}/")
+        return
+
+    chunked_docs = split_documents(case_files)
+    print(f"✂️ Split into {len(chunked_docs)} chunks")
+
+    unique_docs = deduplicate_chunks(chunked_docs)
+    print(f"🧬 {len(unique_docs)} unique chunks after removing {len(chunked_docs) - len(unique_docs)} duplicates")
+
+    embeddings = OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        dimensions=EMBEDDING_DIMENSIONS,
+        chunk_size=EMBED_BATCH_SIZE,
+        max_retries=6,
+        request_timeout=60,
+    )
+    vectorstore = build_vectorstore(unique_docs, embeddings)
+    vectorstore.save_local(INDEX_DIR)
+    CORPUS_HASH_PATH.write_text(digest)
+    print(f"✅ Saved FAISS index to {INDEX_DIR}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+
+from server_config import WORKER_THREADS
+
+# /ask spends most of its time waiting on OpenAI, so each worker runs many
+# threads; blocking socket reads release the GIL and requests overlap.
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+# With the optional cuVS GPU search, every worker builds its own CAGRA graph
+# on the default device: set WEB_CONCURRENCY=1 per GPU.
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+threads = WORKER_THREADS
+worker_class = "gthread"
+timeout = 120
+
+# Build the app (docstore, BM25 index) once in the master;
+# forked workers share those pages copy-on-write. The FAISS vectors are
+# mmapped from index.faiss and shared through the page cache.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # CUDA (the optional CAGRA graph), torch (the reranker) and thread
+    # pools can't be set up before the fork.
+    import app
+
+    app.init_worker()
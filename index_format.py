@@ -0,0 +1,47 @@
+# ====================================
+# Settings and metadata shared by build_index.py and app.py. Kept free of
+# import-time side effects and heavy imports so the web app can use it
+# without pulling in the offline build.
+# ====================================
+
+# text-embedding-3-small truncated to 512 dims: cheaper than ada-002 and a
+# third of the vector size. app.py embeds queries with the same settings.
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 512
+
+
+def source_entry(case, summary):
+    return {
+        "case_name": case.get("case_name"),
+        "citation": case.get("neutral_citation"),
+        "court": case.get("court"),
+        "judgment_date": case.get("judgment_date"),
+        "saflii_url": case.get("saflii_case_url") or case.get("saflii_url"),
+        "pdf_url": case.get("pdf_url"),
+        # short preview of the chunk
+        "summary": summary,
+    }
+
+
+def source_header(case):
+    header = f"Source: {case.get('case_name') or 'Unknown case'} ({case.get('neutral_citation') or ''})"
+    court = case.get("court") or ""
+    jd = case.get("judgment_date") or ""
+    if court or jd:
+        header += f" – {court} {jd}".strip()
+    saflii_url = case.get("saflii_case_url") or case.get("saflii_url") or ""
+    if saflii_url:
+        header += f"\nSAFLII: {saflii_url}"
+    return header
+
+
+def add_display_fields(doc):
+    # Everything app.py shows for a chunk, computed once at build time rather
+    # than on every request: the context header and snippet for the prompt
+    # (800 chars), the sources-drawer snippet (400 chars) and the drawer entries.
+    m = doc.metadata
+    m["source_header"] = source_header(m)
+    m["preview_800"] = doc.page_content[:800] + "..."
+    m["preview_400"] = doc.page_content[:400] + "..."
+    m["sources"] = [source_entry(m, m["preview_400"])]
+    return doc
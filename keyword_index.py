@@ -0,0 +1,53 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index, built once at startup.
+
+    A query only touches the postings of its own terms, so scoring cost
+    depends on how common those terms are rather than on corpus size.
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.postings = defaultdict(list)  # token -> [(doc index, term frequency)]
+
+        lengths = []
+        for i, doc in enumerate(documents):
+            counts = Counter(tokenize(doc.page_content))
+            lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self.postings[token].append((i, tf))
+
+        n = len(documents)
+        avgdl = sum(lengths) / n if n else 0.0
+        self.idf = {
+            token: math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for token, posting in self.postings.items()
+        }
+        self.length_norms = [
+            k1 * (1 - b + b * length / avgdl) if avgdl else k1
+            for length in lengths
+        ]
+
+    def get_top_n(self, query, n=5):
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i, tf in self.postings[token]:
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + self.length_norms[i])
+
+        best = heapq.nlargest(n, scores.items(), key=lambda item: item[1])
+        return [self.documents[i] for i, _ in best]
@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class _VectorRows:
+    """Unit vectors of one namespace's cached queries, stacked for one matmul.
+
+    Rows are written in place (capacity doubles when full) and removed by
+    moving the last row into the gap, so neither puts nor evictions restack
+    the matrix.
+    """
+
+    def __init__(self):
+        self.keys = []  # row -> key
+        self._rows = {}  # key -> row
+        self._vectors = None
+        self._expires = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def vectors(self):
+        return self._vectors[:len(self.keys)]
+
+    @property
+    def expires(self):
+        return self._expires[:len(self.keys)]
+
+    def add(self, key, vector, expires_at):
+        self.remove(key)
+        n = len(self.keys)
+        if self._vectors is None:
+            self._vectors = np.empty((16, vector.shape[0]), dtype="float32")
+            self._expires = np.empty(16)
+        elif n == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+            self._expires = np.concatenate([self._expires, np.empty_like(self._expires)])
+        self._vectors[n] = vector
+        self._expires[n] = expires_at
+        self._rows[key] = n
+        self.keys.append(key)
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self.keys) - 1
+        last_key = self.keys.pop()
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._expires[row] = self._expires[last]
+            self.keys[row] = last_key
+            self._rows[last_key] = row
+
+
+class QueryCache:
+    """Thread-safe LRU + TTL cache for /ask responses.
+
+    Entries are looked up first by exact key and then, on a miss, by cosine
+    similarity between the query embedding and the embeddings of cached
+    queries in the same namespace (mode + prompt type).
+    """
+
+    def __init__(self, max_size=2000, ttl_seconds=600, similarity_threshold=0.95):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()  # key -> (expires_at, namespace, value)
+        self._vectors = {}  # namespace -> _VectorRows
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self._expired(key, entry):
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def get_similar(self, namespace, vector):
+        with self._lock:
+            rows = self._vectors.get(namespace)
+            if rows:
+                # Drop expired rows first, so a stale best match can't hide a
+                # fresh runner-up that also clears the threshold.
+                now = time.monotonic()
+                for key in [rows.keys[r] for r in np.flatnonzero(rows.expires <= now)]:
+                    self._drop(key)
+                    self.evictions += 1
+            if not rows:
+                self.misses += 1
+                return None
+
+            scores = rows.vectors @ self._unit(vector)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            key = rows.keys[best]
+            self._entries.move_to_end(key)
+            self.semantic_hits += 1
+            return self._entries[key][2]
+
+    def put(self, key, value, namespace=None, vector=None):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            expires_at = time.monotonic() + self.ttl_seconds
+            self._entries[key] = (expires_at, namespace, value)
+            if vector is not None:
+                rows = self._vectors.setdefault(namespace, _VectorRows())
+                rows.add(key, self._unit(vector), expires_at)
+
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            hits = self.hits + self.semantic_hits
+            lookups = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+    def _expired(self, key, entry):
+        if entry[0] > time.monotonic():
+            return False
+        self._drop(key)
+        self.evictions += 1
+        return True
+
+    def _drop(self, key):
+        _, namespace, _ = self._entries.pop(key)
+        rows = self._vectors.get(namespace)
+        if rows is not None:
+            rows.remove(key)
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,7 @@
+# ====================================
+# Concurrency settings read by both gunicorn_conf.py and app.py, kept in one
+# place so the thread count and the pools sized against it can't drift.
+# ====================================
+
+# gthreads per gunicorn worker; each can have one OpenAI call in flight.
+WORKER_THREADS = 16